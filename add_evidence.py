@@ -7,17 +7,21 @@ to the database with proper embeddings for semantic search.
 
 Usage:
     python add_evidence.py --file evidence_data.json
+    python add_evidence.py --file evidence_data.json --bulk-copy
     or
     python add_evidence.py --text "Your evidence text" --market korea --type interview_transcript
+
+Requires the content_hash column from sql/evidence_content_hash.sql.
 """
 
 import os
 import sys
 import argparse
 import json
-from datetime import datetime, date
+import hashlib
+from datetime import datetime, date, timezone
 from supabase import create_client
-from sentence_transformers import SentenceTransformer
+from embedding_model import get_model
 
 def load_config():
     """Load configuration from environment"""
@@ -39,24 +43,168 @@ def init_services():
     supabase_url, supabase_key = load_config()
     
     supabase = create_client(supabase_url, supabase_key)
-    embeddings = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    embeddings = get_model()
     
     print("✅ Services initialized")
     return supabase, embeddings
 
+VALID_MARKETS = ['korea', 'poland', 'turkey', 'global']
+VALID_TYPES = ['interview_transcript', 'social_listening', 'search_query', 'user_quote', 'behavioral_data']
+
+ENCODE_BATCH_SIZE = 64
+INSERT_CHUNK_SIZE = 500
+
+# Hashes per content_hash IN (...) lookup, keeps the request URL short
+HASH_LOOKUP_CHUNK = 100
+
+# Files above this size are stream-parsed with ijson (optional dependency)
+STREAM_PARSE_MIN_BYTES = 2_000_000
+
+def validate_evidence(market, source_type):
+    """Check market and source type against the allowed values"""
+    if market not in VALID_MARKETS:
+        print(f"❌ Invalid market. Must be one of: {VALID_MARKETS}")
+        return False
+    
+    if source_type not in VALID_TYPES:
+        print(f"❌ Invalid source type. Must be one of: {VALID_TYPES}")
+        return False
+    
+    return True
+
+def encode_length_sorted(embeddings, texts):
+    """Encode texts shortest-first so each minibatch pads to a similar length"""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = embeddings.encode(
+        [texts[i] for i in order],
+        batch_size=ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=len(texts) > 1
+    )
+    
+    # Restore the original order
+    out = [None] * len(texts)
+    for i, vector in zip(order, vectors):
+        out[i] = vector.tolist()
+    return out
+
+def content_hash(market, source_type, content):
+    """sha256 of market, source type and text, matches the content_hash column
+    
+    The same quote filed under another market or source type is a separate row.
+    """
+    key = f"{market}\n{source_type}\n{content}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def find_existing_hashes(supabase, hashes):
+    """Return the subset of hashes already stored in research_evidence"""
+    existing = set()
+    for start in range(0, len(hashes), HASH_LOOKUP_CHUNK):
+        chunk = hashes[start:start + HASH_LOOKUP_CHUNK]
+        try:
+            result = supabase.table("research_evidence").select("content_hash").in_("content_hash", chunk).execute()
+        except Exception as e:
+            if 'content_hash' in str(e):
+                raise RuntimeError(
+                    "research_evidence has no content_hash column, run sql/evidence_content_hash.sql first"
+                ) from e
+            raise
+        existing.update(row['content_hash'] for row in result.data or [])
+    return existing
+
+def connect_bulk_copy():
+    """Open a direct Postgres connection for COPY imports (needs psycopg)"""
+    db_url = os.getenv("SUPABASE_DB_URL")
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL must be set in .env for --bulk-copy")
+        sys.exit(1)
+    
+    import psycopg
+    return psycopg.connect(db_url)
+
+def copy_evidence_rows(db_conn, rows):
+    """Stream rows into research_evidence with COPY, bypassing PostgREST"""
+    columns = ["market", "source_type", "content", "content_hash", "embedding", "metadata", "source_date", "created_at"]
+    
+    with db_conn.transaction():
+        with db_conn.cursor() as cur:
+            with cur.copy(f"COPY research_evidence ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row((
+                        row["market"],
+                        row["source_type"],
+                        row["content"],
+                        row["content_hash"],
+                        # pgvector text format
+                        "[" + ",".join(map(repr, row["embedding"])) + "]",
+                        json.dumps(row["metadata"]),
+                        row["source_date"],
+                        row["created_at"]
+                    ))
+    
+    return len(rows)
+
+def add_evidence_batch(supabase, embeddings, items, db_conn=None):
+    """Embed and insert a list of validated evidence items, returns count added"""
+    if not items:
+        return 0
+    
+    try:
+        # Skip content that is already stored, or repeated within this batch
+        hashes = [content_hash(item['market'], item['source_type'], item['content']) for item in items]
+        seen = find_existing_hashes(supabase, list(set(hashes)))
+        new_items = []
+        for item, h in zip(items, hashes):
+            if h in seen:
+                continue
+            seen.add(h)
+            new_items.append((item, h))
+        
+        skipped = len(items) - len(new_items)
+        if skipped:
+            print(f"⏭️  Skipped {skipped} items with unchanged content")
+        if not new_items:
+            return 0
+        
+        # Encode all contents in one call so the model batches them
+        vectors = encode_length_sorted(embeddings, [item['content'] for item, _ in new_items])
+        
+        # Prepare data, every row in a batch shares the same timestamps
+        today_iso = date.today().isoformat()
+        now_iso = datetime.now(timezone.utc).isoformat()
+        rows = [{
+            "market": item['market'],
+            "source_type": item['source_type'],
+            "content": item['content'],
+            "content_hash": h,
+            "embedding": vector,
+            "metadata": item.get('metadata') or {},
+            "source_date": today_iso,
+            "created_at": now_iso
+        } for (item, h), vector in zip(new_items, vectors)]
+        
+        if db_conn is not None:
+            return copy_evidence_rows(db_conn, rows)
+        
+        # Insert into database, one round trip per chunk (content_hash guards against races)
+        added = 0
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + INSERT_CHUNK_SIZE]
+            supabase.table("research_evidence").upsert(chunk, on_conflict="content_hash", ignore_duplicates=True).execute()
+            added += len(chunk)
+        
+        return added
+        
+    except Exception as e:
+        print(f"❌ Error adding evidence: {str(e)}")
+        return 0
+
 def add_single_evidence(supabase, embeddings, market, source_type, content, metadata=None):
     """Add a single evidence item"""
     
     # Validate inputs
-    valid_markets = ['korea', 'poland', 'turkey', 'global']
-    valid_types = ['interview_transcript', 'social_listening', 'search_query', 'user_quote', 'behavioral_data']
-    
-    if market not in valid_markets:
-        print(f"❌ Invalid market. Must be one of: {valid_markets}")
-        return False
-    
-    if source_type not in valid_types:
-        print(f"❌ Invalid source type. Must be one of: {valid_types}")
+    if not validate_evidence(market, source_type):
         return False
     
     print(f"\n📝 Adding evidence...")
@@ -64,68 +212,101 @@ def add_single_evidence(supabase, embeddings, market, source_type, content, meta
     print(f"   Type: {source_type}")
     print(f"   Content: {content[:50]}...")
     
-    try:
-        # Generate embedding
-        embedding = embeddings.encode(content).tolist()
-        
-        # Prepare data
-        data = {
-            "market": market,
-            "source_type": source_type,
-            "content": content,
-            "embedding": embedding,
-            "metadata": metadata or {},
-            "source_date": date.today().isoformat(),
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        # Insert into database
-        result = supabase.table("research_evidence").insert(data).execute()
-        
+    item = {
+        "market": market,
+        "source_type": source_type,
+        "content": content,
+        "metadata": metadata
+    }
+    
+    if add_evidence_batch(supabase, embeddings, [item]):
         print(f"✅ Evidence added successfully!")
         return True
+    return False
+
+def iter_evidence_file(file_path):
+    """Yield evidence items from a JSON array, streaming large files with ijson"""
+    if os.path.getsize(file_path) > STREAM_PARSE_MIN_BYTES:
+        try:
+            import ijson
+        except ImportError:
+            ijson = None
         
-    except Exception as e:
-        print(f"❌ Error adding evidence: {str(e)}")
-        return False
+        if ijson:
+            print("   Streaming large file with ijson")
+            with open(file_path, 'rb') as f:
+                events = ijson.parse(f, use_float=True)
+                _, event, _ = next(events, (None, None, None))
+                if event != 'start_array':
+                    raise ValueError("JSON file must contain an array of evidence items")
+                
+                count = 0
+                for item in ijson.items(events, 'item'):
+                    count += 1
+                    yield item
+            # The count is only known once the stream has been read
+            print(f"Found {count} evidence items")
+            return
+    
+    # Small files parse faster with the stdlib
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    if not isinstance(data, list):
+        raise ValueError("JSON file must contain an array of evidence items")
+    
+    print(f"Found {len(data)} evidence items to process")
+    yield from data
 
-def add_bulk_evidence(supabase, embeddings, file_path):
+def add_bulk_evidence(supabase, embeddings, file_path, db_conn=None):
     """Add multiple evidence items from JSON file"""
     
     print(f"\n📦 Loading evidence from: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        if not isinstance(data, list):
-            print("❌ JSON file must contain an array of evidence items")
-            return
-        
-        print(f"Found {len(data)} evidence items to process")
-        
+        total_count = 0
         success_count = 0
-        for i, item in enumerate(data, 1):
-            print(f"\n[{i}/{len(data)}]")
-            
+        window = []
+        
+        for i, item in enumerate(iter_evidence_file(file_path), 1):
+            total_count = i
             market = item.get('market')
             source_type = item.get('source_type')
             content = item.get('content')
-            metadata = item.get('metadata', {})
             
             if not all([market, source_type, content]):
                 print(f"❌ Skipping item {i}: missing required fields")
                 continue
             
-            if add_single_evidence(supabase, embeddings, market, source_type, content, metadata):
-                success_count += 1
+            if not validate_evidence(market, source_type):
+                print(f"❌ Skipping item {i}: invalid market or source type")
+                continue
+            
+            window.append({
+                "market": market,
+                "source_type": source_type,
+                "content": content,
+                "metadata": item.get('metadata', {})
+            })
+            
+            # Embed and insert as we go so memory stays bounded to one window
+            if len(window) >= INSERT_CHUNK_SIZE:
+                print(f"\n🤖 Embedding {len(window)} valid items...")
+                success_count += add_evidence_batch(supabase, embeddings, window, db_conn)
+                window = []
+        
+        if window:
+            print(f"\n🤖 Embedding {len(window)} valid items...")
+            success_count += add_evidence_batch(supabase, embeddings, window, db_conn)
         
-        print(f"\n🎉 Complete! Added {success_count}/{len(data)} evidence items")
+        print(f"\n🎉 Complete! Added {success_count}/{total_count} evidence items")
         
     except FileNotFoundError:
         print(f"❌ File not found: {file_path}")
     except json.JSONDecodeError:
         print(f"❌ Invalid JSON in file: {file_path}")
+    except ValueError as e:
+        print(f"❌ {str(e)}")
     except Exception as e:
         print(f"❌ Error: {str(e)}")
 
@@ -140,6 +321,7 @@ def main():
     
     # Bulk mode
     parser.add_argument("--file", help="JSON file with bulk evidence data")
+    parser.add_argument("--bulk-copy", action="store_true", help="Load --file with Postgres COPY via SUPABASE_DB_URL (needs psycopg)")
     
     args = parser.parse_args()
     
@@ -148,7 +330,12 @@ def main():
     
     # Bulk mode
     if args.file:
-        add_bulk_evidence(supabase, embeddings, args.file)
+        db_conn = connect_bulk_copy() if args.bulk_copy else None
+        try:
+            add_bulk_evidence(supabase, embeddings, args.file, db_conn)
+        finally:
+            if db_conn is not None:
+                db_conn.close()
     
     # Single item mode
     elif args.text and args.market and args.type:
@@ -1,6 +1,11 @@
 import streamlit as st
 import os
-import json
+import re
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 
 # Page config
 st.set_page_config(
@@ -21,6 +26,10 @@ if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 if "app_mode" not in st.session_state:
     st.session_state.app_mode = "Chat"
+if "scenario_results" not in st.session_state:
+    st.session_state.scenario_results = []
+if "trivial_hits" not in st.session_state:
+    st.session_state.trivial_hits = 0
 
 # Sidebar - Debug Toggle
 with st.sidebar:
@@ -50,44 +59,84 @@ def debug_print(message, type="info"):
         else:
             st.write(message)
 
+@st.cache_resource
+def load_config():
+    """Resolve credentials once per process: Streamlit secrets first, then environment"""
+    return {
+        key: st.secrets.get(key, os.getenv(key))
+        for key in ("SUPABASE_URL", "SUPABASE_KEY", "ANTHROPIC_API_KEY")
+    }
+
+CONFIG = load_config()
+
 # Initialize connections
 @st.cache_resource
 def init_supabase():
     debug_print("🔧 Initializing Supabase connection...")
-    url = st.secrets.get("SUPABASE_URL", os.getenv("SUPABASE_URL"))
-    key = st.secrets.get("SUPABASE_KEY", os.getenv("SUPABASE_KEY"))
+    url = CONFIG["SUPABASE_URL"]
+    key = CONFIG["SUPABASE_KEY"]
     if not url or not key:
         return None
-    from supabase import create_client
+    import httpx
+    from supabase import ClientOptions, create_client
+    # httpx drops idle connections after 5s, so almost every chat turn paid a
+    # fresh TLS handshake. Hand supabase one client that keeps connections
+    # warm between turns and multiplexes over HTTP/2; it is reused whenever
+    # the PostgREST client is recreated (e.g. on auth events)
+    http_client = httpx.Client(
+        timeout=ClientOptions.postgrest_client_timeout,
+        follow_redirects=True,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=120.0),
+    )
+    client = create_client(url, key, options=ClientOptions(httpx_client=http_client))
     debug_print("✅ Supabase connected", "success")
-    return create_client(url, key)
+    return client
 
 @st.cache_resource
 def init_embeddings():
     debug_print("🤖 Loading embedding model (sentence-transformers)...")
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    from embedding_model import QueryEmbeddings, get_model
+    # Searches cast the query to halfvec, so 6 decimals loses nothing and
+    # roughly halves the JSON size of every search RPC
+    embeddings = QueryEmbeddings(get_model(), cache_size=1024, decimals=6)
     debug_print("✅ Embedding model loaded (384 dimensions)", "success")
     return embeddings
 
-def init_llm():
-    debug_print("🧠 Initializing Claude LLM...")
+# Persona answers are 2-4 sentences, so a small decode budget is plenty;
+# short questions go to the faster model
+LLM_MODEL = "claude-sonnet-4-20250514"
+FAST_LLM_MODEL = "claude-3-5-haiku-20241022"
+MAX_RESPONSE_TOKENS = 300
+
+@st.cache_resource
+def init_llm(model=LLM_MODEL):
+    debug_print(f"🧠 Initializing Claude LLM ({model})...")
     from langchain_anthropic import ChatAnthropic
-    api_key = st.secrets.get("ANTHROPIC_API_KEY", os.getenv("ANTHROPIC_API_KEY"))
+    api_key = CONFIG["ANTHROPIC_API_KEY"]
     if not api_key:
         return None
     llm = ChatAnthropic(
-        model="claude-sonnet-4-20250514",
+        model=model,
         anthropic_api_key=api_key,
         temperature=0.8,
-        max_tokens=2048
+        max_tokens=MAX_RESPONSE_TOKENS,
+        streaming=True
     )
     debug_print("✅ Claude initialized", "success")
     return llm
 
-# Initialize services
+@st.cache_resource
+def preload_embedding_model():
+    """Import torch and load MiniLM in the background while the other clients start"""
+    from embedding_model import preload_model
+    return preload_model()
+
+# Initialize services (the embedding model loads alongside)
+preload_embedding_model()
 supabase = init_supabase()
 llm = init_llm()
+fast_llm = init_llm(FAST_LLM_MODEL)
 
 if not supabase or not llm:
     st.warning("### ⚙️ Configuration Needed")
@@ -108,57 +157,69 @@ if not supabase or not llm:
     """)
     st.stop()
 
+# Message classes for the Claude prompt
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+
 # Initialize embeddings
 with st.spinner("Loading AI models..." if not st.session_state.show_debug else None):
     embeddings = init_embeddings()
 
 debug_print("✅ All systems initialized and ready!", "success")
 
+# Columns the UI and prompt use; never pull the embedding vector to the client
+EVIDENCE_COLUMNS = "id, market, source_type, content, metadata, source_date"
+
+# Emoji badge per evidence source type
+EVIDENCE_BADGES = {
+    'interview_transcript': '🎤 Interview',
+    'social_listening': '💬 Social',
+    'search_query': '🔍 Search',
+    'user_quote': '💭 Quote',
+    'behavioral_data': '📊 Analytics'
+}
+
 # Helper functions
 def get_evidence_badge(source_type):
     """Return emoji badge for evidence type"""
-    badge_map = {
-        'interview_transcript': '🎤 Interview',
-        'social_listening': '💬 Social',
-        'search_query': '🔍 Search',
-        'user_quote': '💭 Quote',
-        'behavioral_data': '📊 Analytics'
-    }
-    return badge_map.get(source_type, f'📄 {source_type}')
+    return EVIDENCE_BADGES.get(source_type, f'📄 {source_type}')
+
+def format_source_counts(type_counts):
+    """Build the badge count line for a tuple of (source_type, count) pairs"""
+    return " | ".join([
+        f"**{EVIDENCE_BADGES.get(source_type, source_type)}: {count}**" 
+        for source_type, count in type_counts
+    ])
+
+def count_evidence_sources(evidence_list):
+    """(source_type, count) pairs in first-seen order, as stored on each exchange"""
+    return tuple(Counter(ev['source_type'] for ev in evidence_list).items())
+
+def grounding_strength(total_sources):
+    """Label for how well an answer is grounded, by number of evidence sources"""
+    if total_sources >= 5:
+        return "🟢 Strong"
+    if total_sources >= 3:
+        return "🟡 Moderate"
+    return "🟠 Light"
 
-def display_evidence_sources(evidence_list, market=None, show_grounding_strength=True):
-    """Display evidence source counts by type with enhanced visual grounding"""
+def display_evidence_sources(evidence_list, market=None, show_grounding_strength=True, source_counts=None):
+    """Display evidence source counts by type with enhanced visual grounding
     
-    if st.session_state.show_debug:
-        st.write(f"DEBUG: Received {len(evidence_list) if evidence_list else 0} evidence items")
+    Pass the exchange's stored source_counts to skip recounting on reruns.
+    """
     
     if not evidence_list:
         st.warning("⚠️ No evidence found for this query")
         return
     
     # Count evidence by type
-    type_counts = {}
-    for ev in evidence_list:
-        source_type = ev['source_type']
-        if source_type not in type_counts:
-            type_counts[source_type] = 0
-        type_counts[source_type] += 1
-    
-    if st.session_state.show_debug:
-        st.write(f"DEBUG: Found {len(type_counts)} different source types: {list(type_counts.keys())}")
+    if source_counts is None:
+        source_counts = count_evidence_sources(evidence_list)
     
     # Grounding strength indicator
     if show_grounding_strength:
         total_sources = len(evidence_list)
-        if total_sources >= 5:
-            strength = "🟢 Strong"
-            strength_color = "green"
-        elif total_sources >= 3:
-            strength = "🟡 Moderate"
-            strength_color = "orange"
-        else:
-            strength = "🟠 Light"
-            strength_color = "orange"
+        strength = grounding_strength(total_sources)
         
         col1, col2 = st.columns([3, 1])
         with col1:
@@ -169,67 +230,102 @@ def display_evidence_sources(evidence_list, market=None, show_grounding_strength
         st.markdown("**📚 Sources used for this answer:**")
     
     # Display counts with colored badges
-    badge_map = {
-        'interview_transcript': '🎤 Interview',
-        'social_listening': '💬 Social',
-        'search_query': '🔍 Search',
-        'user_quote': '💭 Quote',
-        'behavioral_data': '📊 Analytics'
-    }
-    
-    count_text = " | ".join([
-        f"**{badge_map.get(source_type, source_type)}: {count}**" 
-        for source_type, count in type_counts.items()
-    ])
-    
-    st.markdown(count_text)
+    st.markdown(format_source_counts(source_counts))
     st.markdown("")
 
+def evidence_quotes_markdown(evidence_list, max_chars=None, show_metadata=False):
+    """Badge, market and quoted content for each item as one markdown string (one element)"""
+    blocks = []
+    for ev in evidence_list:
+        content = shorten(ev['content'], max_chars) if max_chars else ev['content']
+        content = content.replace("\n", "\n> ")  # keep multi-line quotes inside the blockquote
+        block = f"**{get_evidence_badge(ev['source_type'])}** • {ev['market'].upper()}\n\n> \"{content}\""
+        if show_metadata and ev.get('metadata'):
+            block += f"\n\n*Metadata: {ev['metadata']}*"
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
 def display_evidence_cards(evidence_list, max_display=3):
-    """Display top evidence as cards with highlights"""
+    """Display top evidence as quote cards in a single markdown element"""
     if not evidence_list:
         return
     
-    st.markdown("**🔍 Top Supporting Evidence:**")
+    st.markdown("**🔍 Top Supporting Evidence:**\n\n" + evidence_quotes_markdown(evidence_list[:max_display]))
+
+# Exchanges that keep their evidence and debug info in session state
+MAX_TURNS = 20
+
+# Evidence fields the history view renders (metadata only in debug mode)
+HISTORY_EVIDENCE_FIELDS = ('id', 'source_type', 'market')
+HISTORY_CONTENT_CHARS = 500
+
+def compact_evidence(ev):
+    """Keep only the evidence fields the history view renders, with content cut short"""
+    compact = {field: ev.get(field) for field in HISTORY_EVIDENCE_FIELDS if field in ev}
+    compact['content'] = ev.get('content', '')[:HISTORY_CONTENT_CHARS]
+    if st.session_state.show_debug and ev.get('metadata'):
+        compact['metadata'] = ev['metadata']
+    return compact
+
+def trim_conversation_history(conversation):
+    """Drop evidence and debug info from exchanges older than the last MAX_TURNS
     
-    # Show top N evidence items
-    for idx, ev in enumerate(evidence_list[:max_display]):
-        badge_text = get_evidence_badge(ev['source_type'])
-        
-        # Create a card-like display
-        with st.container():
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.markdown(f"**{badge_text}**")
-            with col2:
-                st.caption(f"{ev['market'].upper()}")
-            
-            # Display content in a highlighted box
-            st.info(f'"{ev["content"]}"')
-            
-            if idx < len(evidence_list) - 1 and idx < max_display - 1:
-                st.markdown("")  # Spacing between cards
+    Questions and answers are kept so the full transcript is still saved,
+    but session memory no longer grows with every evidence list.
+    """
+    for item in conversation[:-MAX_TURNS]:
+        item.pop('evidence', None)
+        item.pop('source_counts', None)
+        item.pop('debug_info', None)
+
+logger = logging.getLogger(__name__)
+
+# Single-worker writers shared by all sessions; each session always uses the same one
+TRANSCRIPT_WRITERS = 4
+
+@st.cache_resource
+def get_transcript_writers():
+    return [ThreadPoolExecutor(max_workers=1) for _ in range(TRANSCRIPT_WRITERS)]
+
+def get_transcript_writer(session_id):
+    """This session's writer, so its transcript upserts land in the order they were made"""
+    writers = get_transcript_writers()
+    return writers[hash(session_id) % len(writers)]
+
+def run_in_background(executor, label, fn, *args):
+    """Submit a database write without holding up the rerun
+    
+    Worker threads have no Streamlit context, so failures go to the server log.
+    """
+    def report(future):
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Error %s", label, exc_info=exc)
+    executor.submit(fn, *args).add_done_callback(report)
+
+def upsert_conversation_transcript(persona_id, session_id, transcript_data):
+    supabase.table("persona_conversation_transcripts").upsert({
+        'persona_id': persona_id,
+        'session_id': session_id,
+        'transcript': transcript_data
+    }, on_conflict='persona_id,session_id').execute()
 
 def save_conversation_transcript(persona_id, session_id, conversation):
     """Save or update conversation transcript for a persona session"""
-    try:
-        # Convert conversation to JSONB format
-        transcript_data = [{
-            'question': item['question'],
-            'answer': item['answer'],
-            'timestamp': item.get('timestamp', '')
-        } for item in conversation]
-        
-        # Upsert transcript (insert or update if exists)
-        supabase.table("persona_conversation_transcripts").upsert({
-            'persona_id': persona_id,
-            'session_id': session_id,
-            'transcript': transcript_data
-        }, on_conflict='persona_id,session_id').execute()
-        
-        debug_print(f"✅ Saved transcript: {len(transcript_data)} exchanges", "success")
-    except Exception as e:
-        debug_print(f"❌ Error saving transcript: {str(e)}", "error")
+    # Convert conversation to JSONB format (snapshot taken here, before the rerun)
+    transcript_data = [{
+        'question': item['question'],
+        'answer': item['answer'],
+        'timestamp': item.get('timestamp', ''),
+        **({'trivial': True} if item.get('trivial') else {})
+    } for item in conversation]
+    
+    # Upsert transcript (insert or update if exists) off the critical path
+    run_in_background(
+        get_transcript_writer(session_id), "saving transcript",
+        upsert_conversation_transcript, persona_id, session_id, transcript_data
+    )
+    debug_print(f"💾 Saving transcript: {len(transcript_data)} exchanges", "success")
 
 def load_conversation_transcript(persona_id, session_id):
     """Load existing conversation transcript for a persona session"""
@@ -247,59 +343,111 @@ def load_conversation_transcript(persona_id, session_id):
         debug_print(f"❌ Error loading transcript: {str(e)}", "error")
         return []
 
+def insert_conversation_log(log_entry):
+    supabase.table("conversation_logs").insert(log_entry).execute()
+
 def log_conversation_exchange(persona_id, session_id, question, answer, evidence):
     """Log a single conversation exchange to the conversation_logs table"""
-    try:
-        from datetime import datetime
-        
-        # Prepare evidence data for storage
-        evidence_data = [{
-            'source_type': ev.get('source_type'),
-            'market': ev.get('market'),
-            'content': ev.get('content', '')[:500]  # Truncate long content
-        } for ev in evidence] if evidence else []
-        
-        # Insert log entry
-        supabase.table("conversation_logs").insert({
-            'persona_id': persona_id,
-            'session_id': session_id,
-            'question': question,
-            'answer': answer,
-            'evidence_used': evidence_data
-        }).execute()
-        
-        debug_print("✅ Logged conversation exchange", "success")
-    except Exception as e:
-        debug_print(f"❌ Error logging exchange: {str(e)}", "error")
+    # Reference evidence by id; the content already lives in research_evidence
+    evidence_data = [{
+        'evidence_id': ev.get('id'),
+        'source_type': ev.get('source_type'),
+        'market': ev.get('market')
+    } for ev in evidence] if evidence else []
+    
+    # Insert log entry on the shared pool, concurrently with the transcript save
+    run_in_background(get_executor(), "logging exchange", insert_conversation_log, {
+        'persona_id': persona_id,
+        'session_id': session_id,
+        'question': question,
+        'answer': answer,
+        'evidence_used': evidence_data
+    })
+    debug_print("📝 Logging conversation exchange", "success")
+
+def shorten(text, limit):
+    """Cut text to limit characters, marking the cut with '...'"""
+    return f"{text[:limit]}..." if len(text) > limit else text
 
 # Load personas
-def load_personas():
-    debug_print("📋 Loading personas from database...")
-    result = supabase.table("personas").select("*").execute()
-    debug_print(f"✅ Loaded {len(result.data) if result.data else 0} personas", "success")
+PERSONA_COLUMNS = (
+    "id, name, market, household, devices, routines, tensions, language_style, "
+    "age, occupation, bio, pain_points, goals"
+)
+
+@st.cache_data(ttl="1h", max_entries=4, show_spinner=False)
+def fetch_personas():
+    """Personas are reference data, so keep them (and the market grouping) for an hour"""
+    try:
+        result = supabase.table("personas").select(PERSONA_COLUMNS).execute()
+    except Exception:
+        # Older persona tables lack some of the newer profile columns
+        result = supabase.table("personas").select("*").execute()
+    personas = result.data if result.data else []
+    
+    # Group by market in one pass, keeping database order, and build the
+    # scenario labels here so reruns don't re-slice every household string
+    markets = {}
+    for p in personas:
+        markets.setdefault(p['market'], []).append(p)
+        household = p.get('household') or ''
+        p['_label'] = f"{p['name']} ({shorten(household, 30)})" if household else p['name']
+        p['_short_household'] = shorten(household, 40)
+    
+    return personas, markets
+
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def fetch_fallback_evidence(market: str):
+    """Unranked evidence for a market, used when vector search finds nothing"""
+    result = supabase.table("research_evidence").select(EVIDENCE_COLUMNS).eq("market", market).limit(3).execute()
     return result.data if result.data else []
 
-def search_evidence(question: str, market: str, limit: int = 5):
-    query_embedding = embeddings.embed_query(question)
+def load_personas_and_markets():
+    debug_print("📋 Loading personas from database...")
+    personas, markets = fetch_personas()
+    debug_print(f"✅ Loaded {len(personas)} personas", "success")
+    return personas, markets
+
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+def normalize_question(question: str):
+    """Case- and whitespace-insensitive cache key (MiniLM is uncased, so the embedding is the same)"""
+    return " ".join(question.lower().split())
+
+def get_query_embedding(question: str):
+    """Embed a question once per turn (repeat questions hit the model's LRU cache)"""
+    return embeddings.embed_query(normalize_question(question))
+
+def check_evidence_embeddings(market: str):
+    """Report evidence rows missing embeddings (extra query, only with EVIDENCE_DEBUG set)"""
+    if not os.getenv("EVIDENCE_DEBUG"):
+        return []
     
-    debug_info = []
+    debug_info = [f"🔍 DEBUG: Database check for market '{market}':"]
+    try:
+        # Only fetch ids of rows without an embedding, never the vectors themselves
+        check_result = supabase.table("research_evidence").select("id, source_type", count="exact").eq("market", market).is_("embedding", "null").limit(3).execute()
+        missing = check_result.count or 0
+        if missing:
+            debug_info.append(f"   - ❌ {missing} evidence items are MISSING embeddings")
+            for item in check_result.data:
+                debug_info.append(f"   - {item.get('source_type')}: Embedding = ❌ MISSING")
+        else:
+            debug_info.append("   - ✅ All evidence items have embeddings")
+    except Exception as e:
+        debug_info.append(f"   - Error checking database: {str(e)}")
+    return debug_info
+
+def search_evidence(query_embedding, market: str, limit: int = 5, debug: bool = False, raise_errors: bool = False):
+    """Run the per-market search_evidence RPC (no Streamlit calls, safe on worker threads)
     
-    # Check if we have evidence
-    if st.session_state.show_debug:
-        try:
-            check_result = supabase.table("research_evidence").select("id, market, source_type, embedding").eq("market", market).limit(3).execute()
-            debug_info.append(f"🔍 DEBUG: Database check for market '{market}':")
-            if check_result.data:
-                debug_info.append(f"   - Found {len(check_result.data)} evidence items in database")
-                for item in check_result.data:
-                    has_embedding = item.get('embedding') is not None
-                    debug_info.append(f"   - {item.get('source_type')}: Embedding = {'✅ Yes' if has_embedding else '❌ MISSING'}")
-            else:
-                debug_info.append(f"   - ❌ No evidence found in database for market '{market}'")
-        except Exception as e:
-            debug_info.append(f"   - Error checking database: {str(e)}")
-        
-        debug_info.append(f"🔍 DEBUG: Searching with vector similarity (threshold=0.65)...")
+    RPC failures return no evidence unless raise_errors is set.
+    """
+    debug_info = []
+    if debug:
+        debug_info.append(f"🔍 DEBUG: Searching '{market}' with vector similarity (threshold=0.65)...")
     
     # Try vector search
     try:
@@ -313,7 +461,7 @@ def search_evidence(question: str, market: str, limit: int = 5):
             }
         ).execute()
         
-        if st.session_state.show_debug:
+        if debug:
             if result.data:
                 debug_info.append(f"   - ✅ Vector search found {len(result.data)} matching items")
             else:
@@ -321,33 +469,126 @@ def search_evidence(question: str, market: str, limit: int = 5):
         
         return result.data if result.data else [], debug_info
     except Exception as e:
-        if st.session_state.show_debug:
+        if debug:
             debug_info.append(f"   - ❌ Search function error: {str(e)}")
             debug_info.append("   - This usually means the search_evidence function doesn't exist or has wrong parameters")
+        if raise_errors:
+            raise
         return [], debug_info
 
-def generate_synthetic_response(persona, question, evidence_data, conversation_history):
-    """Generate response using full conversation context and evidence"""
+def dedupe_evidence(evidence_list):
+    """Drop repeated rows (same id) while keeping the original order"""
+    seen = set()
+    unique = []
+    for ev in evidence_list:
+        ev_id = ev.get('id')
+        if ev_id is not None:
+            if ev_id in seen:
+                continue
+            seen.add(ev_id)
+        unique.append(ev)
+    return unique
+
+# EVIDENCE_SEARCH=local keeps each market's embeddings in memory and ranks
+# them in-process, skipping the search RPC (for small evidence sets)
+LOCAL_EVIDENCE_SEARCH = os.getenv("EVIDENCE_SEARCH", "").lower() == "local"
+LOCAL_INDEX_PAGE = 1000
+
+@st.cache_resource(ttl="1h", show_spinner=False)
+def get_market_index(market: str):
+    """(unit-norm float32 matrix, rows) for every embedded evidence row in a market"""
+    import json
+    import numpy as np
+    rows = []
+    while True:
+        page = supabase.table("research_evidence").select(f"{EVIDENCE_COLUMNS}, embedding").eq("market", market).not_.is_("embedding", "null").order("id").range(len(rows), len(rows) + LOCAL_INDEX_PAGE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < LOCAL_INDEX_PAGE:
+            break
     
-    # Build evidence context
-    evidence_context = []
-    for item in evidence_data:
-        evidence_context.append(f"Source: {item['source_type']} ({item['market']})\nContent: {item['content']}\n---")
+    # PostgREST returns vector/halfvec columns as '[...]' strings
+    vectors = np.array([
+        json.loads(embedding) if isinstance(embedding, str) else embedding
+        for embedding in (row.pop('embedding') for row in rows)
+    ], dtype=np.float32).reshape(-1, 384)
+    return vectors, rows
+
+def search_market_index(query_embedding, market: str, limit: int, threshold: float = 0.65):
+    """Exact inner-product search over the in-memory market index
     
-    evidence_text = "\n".join(evidence_context) if evidence_context else "No specific evidence found."
+    Keeps scores strictly above threshold, as search_evidence_multi does.
+    """
+    import numpy as np
+    vectors, rows = get_market_index(market)
+    if not rows:
+        return []
+    scores = vectors @ np.asarray(query_embedding, dtype=np.float32)
+    top = np.argsort(-scores)[:limit]
+    return [{**rows[i], 'similarity': float(scores[i])} for i in top if scores[i] > threshold]
+
+def search_persona_evidence(query_embedding, market: str, local_limit: int = 5, global_limit: int = 2, debug=None, raise_errors=False):
+    """Search the persona's market and 'global' with a single RPC round trip
     
-    # Build conversation history
-    history_text = ""
-    if conversation_history:
-        history_text = "\n\nPrevious conversation context:\n"
-        for item in conversation_history[-6:]:
-            history_text += f"User asked: {item['question']}\n"
-            history_text += f"You responded: {item['answer']}\n\n"
+    Pass debug explicitly when calling from a worker thread (no session state there).
+    With raise_errors, a failed search raises instead of returning no evidence.
+    """
+    if debug is None:
+        debug = st.session_state.show_debug
+    debug_info = []
+    if LOCAL_EVIDENCE_SEARCH:
+        evidence = search_market_index(query_embedding, market, local_limit) + search_market_index(query_embedding, 'global', global_limit)
+        if debug:
+            debug_info.append(f"🔍 DEBUG: In-memory search of '{market}' + 'global' found {len(evidence)} items")
+        return dedupe_evidence(evidence), debug_info
+    if debug:
+        debug_info.extend(check_evidence_embeddings(market))
+        debug_info.append(f"🔍 DEBUG: Searching '{market}' + 'global' in one call (threshold=0.65)...")
     
-    # Updated persona prompt format
-    from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+    try:
+        result = supabase.rpc(
+            "search_evidence_multi",
+            {
+                "query_embedding": query_embedding,
+                "market_filters": [market, 'global'],
+                "match_counts": [local_limit, global_limit],
+                "match_threshold": 0.65
+            }
+        ).execute()
+        
+        if debug:
+            debug_info.append(f"   - ✅ Vector search found {len(result.data or [])} matching items")
+        
+        return dedupe_evidence(result.data or []), debug_info
+    except Exception as e:
+        # search_evidence_multi not deployed yet, fall back to one call per market
+        if debug:
+            debug_info.append(f"   - ⚠️ search_evidence_multi failed ({str(e)}), falling back to per-market search")
+        # Both markets are independent, so issue the two RPCs at the same time
+        executor = get_executor()
+        local_future = executor.submit(search_evidence, query_embedding, market, local_limit, debug, raise_errors)
+        global_future = executor.submit(search_evidence, query_embedding, 'global', global_limit, debug, raise_errors)
+        local_evidence, local_debug = local_future.result()
+        global_evidence, global_debug = global_future.result()
+        return dedupe_evidence(local_evidence + global_evidence), debug_info + local_debug + global_debug
+
+@st.cache_data(ttl="1h", max_entries=512, show_spinner=False)
+def cached_persona_evidence(question, market: str, debug: bool, _query_embedding):
+    """search_persona_evidence memoized on the normalized question; the vector itself is not hashed
     
-    system_prompt = f"""You are {persona['name']}.
+    A failed search raises, so an outage is not cached as "no evidence".
+    """
+    return search_persona_evidence(_query_embedding, market, debug=debug, raise_errors=True)
+
+# Evidence quotes are cut to this many characters in the LLM prompt
+EVIDENCE_PROMPT_CHARS = 500
+
+# Exchanges replayed to Claude as chat messages
+HISTORY_TURNS = 6
+
+@st.cache_data(show_spinner=False)
+def build_persona_prompt(persona):
+    """Format the persona + instructions part of the system prompt once per persona"""
+    return f"""You are {persona['name']}.
 
 Your household: {persona.get('household', 'Not specified')}
 Your devices: {', '.join(persona.get('devices', []))}
@@ -362,115 +603,379 @@ IMPORTANT INSTRUCTIONS:
 3. Use the evidence below to inform your answer
 4. Remember the conversation history - build on previous answers
 5. Stay consistent with what you've said before
-6. Speak naturally as this persona would
+6. Speak naturally as this persona would"""
 
-Evidence from research:
+def build_response_messages(persona, question, evidence_data, conversation_history):
+    """Build the Claude message list from persona, evidence and conversation context"""
+    
+    # Build evidence context
+    evidence_text = "\n".join([
+        f"Source: {item['source_type']} ({item['market']})\nContent: {item['content'][:EVIDENCE_PROMPT_CHARS]}\n---"
+        for item in evidence_data
+    ]) or "No specific evidence found."
+    
+    # Persona block first and marked cacheable, so Anthropic can reuse its
+    # prefill across turns; the evidence block changes every turn
+    evidence_prompt = f"""Evidence from research:
 {evidence_text}
-{history_text}
 
 Now answer the current question naturally, considering both the evidence and our conversation so far."""
 
-    messages = [SystemMessage(content=system_prompt)]
+    messages = [SystemMessage(content=[
+        {"type": "text", "text": build_persona_prompt(persona), "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": evidence_prompt}
+    ])]
     
-    # Add conversation history
-    for item in conversation_history[-4:]:
+    # Add conversation history (the only copy Claude sees)
+    for item in conversation_history[-HISTORY_TURNS:]:
         messages.append(HumanMessage(content=item['question']))
         messages.append(AIMessage(content=item['answer']))
     
     messages.append(HumanMessage(content=question))
     
-    return llm.invoke(messages).content
+    return messages
 
-# Load personas
-personas = load_personas()
+# Questions up to this many words, without a marker asking for reasoning, use FAST_LLM_MODEL
+FAST_QUESTION_WORDS = 12
+DEEP_QUESTION_MARKERS = frozenset({"why", "explain", "compare", "how come", "difference", "describe"})
 
-if not personas:
-    st.warning("⚠️ No personas found. Please run database setup first.")
-    st.stop()
+def select_llm_model(question):
+    """Model name for a question: short, simple questions go to the faster model
+    
+    Markers are matched as whole words (or word pairs), so "show" or
+    "anyhow" do not count as asking for reasoning.
+    """
+    words = re.findall(r"\b\w+\b", question.lower())
+    terms = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+    if len(words) <= FAST_QUESTION_WORDS and terms.isdisjoint(DEEP_QUESTION_MARKERS):
+        return FAST_LLM_MODEL
+    return LLM_MODEL
 
-# Mode tabs
-tab1, tab2 = st.tabs(["💬 Chat", "🎯 Scenario Testing"])
+def select_llm(question):
+    """The LLM client for select_llm_model(question)"""
+    return fast_llm if select_llm_model(question) == FAST_LLM_MODEL else llm
 
-# ============================================================================
-# TAB 1: CHAT MODE (existing functionality)
-# ============================================================================
-with tab1:
-    # Persona Selection
-    st.subheader("🌍 Select a Persona")
+def generate_synthetic_response(persona, question, evidence_data, conversation_history):
+    """Generate response using full conversation context and evidence"""
+    messages = build_response_messages(persona, question, evidence_data, conversation_history)
+    return select_llm(question).invoke(messages).content
+
+def response_cache_key(persona_id, question, evidence_data, conversation_history):
+    """Hash everything that shapes the answer: model, persona, question, evidence ids and recent history"""
+    import hashlib
+    evidence_sig = tuple(sorted(str(ev.get('id') or ev['content']) for ev in evidence_data))
+    history_sig = tuple((item['question'], item['answer']) for item in conversation_history[-HISTORY_TURNS:])
+    key = (select_llm_model(question), persona_id, question, evidence_sig, history_sig)
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+# Stored answers to a paraphrase of a history-free question are reused above this
+RESPONSE_CACHE_THRESHOLD = 0.95
+
+# PostgREST / Postgres codes for a table that does not exist
+MISSING_RELATION_CODES = ('PGRST205', '42P01')
+
+@st.cache_resource
+def get_response_cache_missing():
+    """Process-wide flag, set once llm_response_cache turns out not to exist"""
+    return threading.Event()
+
+# Resolved on the script thread; worker threads only read the Event
+response_cache_missing = get_response_cache_missing()
+
+def check_response_cache_error(error):
+    """Turn stored responses off for the process if the table is missing; True if so"""
+    if getattr(error, 'code', None) not in MISSING_RELATION_CODES:
+        return False
+    if not response_cache_missing.is_set():
+        response_cache_missing.set()
+        logger.warning("llm_response_cache not found, stored responses disabled (apply sql/llm_response_cache.sql)")
+    return True
+
+def fetch_stored_response(cache_key, persona_id=None, query_embedding=None, model=None):
+    """Answer stored by any session for this prompt, or None (also if the table is missing)
     
-    markets = {}
-    for p in personas:
-        if p['market'] not in markets:
-            markets[p['market']] = []
-        markets[p['market']].append(p)
+    With a query embedding (only for turns without history) a stored answer to
+    a near-identical question from the same persona and model also counts.
+    """
+    if response_cache_missing.is_set():
+        return None
+    if query_embedding is not None:
+        try:
+            result = supabase.rpc(
+                "match_response_cache",
+                {
+                    "cache_key": cache_key,
+                    "persona": str(persona_id),
+                    "query_embedding": query_embedding,
+                    "match_threshold": RESPONSE_CACHE_THRESHOLD,
+                    "llm_model": model
+                }
+            ).execute()
+            return result.data[0]['answer'] if result.data else None
+        except Exception:
+            pass  # match_response_cache not deployed, exact lookup only
+    try:
+        result = supabase.table("llm_response_cache").select("answer").eq("key", cache_key).limit(1).execute()
+    except Exception as e:
+        check_response_cache_error(e)
+        return None
+    return result.data[0]['answer'] if result.data else None
+
+def upsert_stored_response(cache_key, answer, persona_id=None, question=None, query_embedding=None):
+    """Upsert one stored answer; the semantic columns are optional like on the fetch side"""
+    row = {'key': cache_key, 'answer': answer}
+    if query_embedding is not None:
+        try:
+            supabase.table("llm_response_cache").upsert({
+                **row, 'persona_id': str(persona_id), 'question': question,
+                'embedding': query_embedding, 'model': select_llm_model(question)
+            }, on_conflict='key').execute()
+            return
+        except Exception as e:
+            if check_response_cache_error(e):
+                return
+            # llm_response_cache_semantic.sql not applied, store the exact entry only
+    try:
+        supabase.table("llm_response_cache").upsert(row, on_conflict='key').execute()
+    except Exception as e:
+        if not check_response_cache_error(e):
+            raise
+
+def store_response(cache_key, answer, persona_id=None, question=None, query_embedding=None):
+    if response_cache_missing.is_set():
+        return
+    run_in_background(
+        get_executor(), "storing response", upsert_stored_response,
+        cache_key, answer, persona_id, question, query_embedding
+    )
+
+def stream_synthetic_response(persona, question, evidence_data, conversation_history):
+    """Yield the response text as Claude generates it (for st.write_stream)"""
+    messages = build_response_messages(persona, question, evidence_data, conversation_history)
+    for chunk in select_llm(question).stream(messages):
+        if isinstance(chunk.content, str) and chunk.content:
+            yield chunk.content
+
+# Scenario personas answered concurrently (bounded to stay under rate limits)
+SCENARIO_WORKERS = 8
+
+@st.cache_data(ttl="1h", max_entries=128, show_spinner=False)
+def search_scenario_evidence(question, markets, _query_embedding):
+    """Evidence for each market in a scenario run, with every market plus 'global' in one RPC
     
-    cols = st.columns(3)
-    for idx, (market, market_personas) in enumerate(markets.items()):
-        with cols[idx]:
-            st.markdown(f"### 🌏 {market.upper()}")
-            for persona in market_personas:
-                display_name = f"{persona['name']}"
-                if persona.get('household'):
-                    display_name += f"\n{persona['household']}"
-                
-                if st.button(
-                    display_name,
-                    key=f"p_{persona['id']}",
-                    use_container_width=True
-                ):
-                    st.session_state.selected_persona = persona
-                    # Load existing conversation transcript for this persona
-                    loaded_transcript = load_conversation_transcript(
-                        persona['id'], 
-                        st.session_state.session_id
-                    )
-                    st.session_state.conversation = loaded_transcript
-                    st.rerun()
+    Personas that share a market share its rows, and 'global' is fetched once.
+    If the per-market fallback fails too, the error is raised rather than cached.
+    """
+    if LOCAL_EVIDENCE_SEARCH:
+        return {
+            market: cached_persona_evidence(question, market, False, _query_embedding)[0]
+            for market in markets
+        }
+    try:
+        result = supabase.rpc(
+            "search_evidence_multi",
+            {
+                "query_embedding": _query_embedding,
+                "market_filters": list(markets) + ['global'],
+                "match_counts": [5] * len(markets) + [2],
+                "match_threshold": 0.65
+            }
+        ).execute()
+    except Exception:
+        # search_evidence_multi not deployed yet, search market by market
+        return {
+            market: cached_persona_evidence(question, market, False, _query_embedding)[0]
+            for market in markets
+        }
+    
+    by_market = {}
+    for row in result.data or []:
+        by_market.setdefault(row['market'], []).append(row)
+    global_rows = by_market.get('global', [])
+    return {
+        market: dedupe_evidence(by_market.get(market, []) + global_rows)
+        for market in markets
+    }
 
-# Chat Interface
-if st.session_state.selected_persona:
+def run_scenario_persona(persona, question, all_evidence, query_embedding):
+    """Answer for one persona from its market's evidence; runs on a scenario worker thread
+    
+    Worker threads have no Streamlit context, so this only calls undecorated
+    helpers (no st.cache_* functions or session state). Returns the result and,
+    for a freshly generated answer, the cache key the caller should store it under.
+    """
+    # No conversation history for scenario testing
+    cache_key = response_cache_key(persona['id'], question, all_evidence, [])
+    answer = fetch_stored_response(cache_key, persona['id'], query_embedding, select_llm_model(question))
+    new_key = None
+    if answer is None:
+        answer = generate_synthetic_response(persona, question, all_evidence, [])
+        new_key = cache_key
+    
+    return {
+        'persona': persona,
+        'answer': answer,
+        'evidence': all_evidence
+    }, new_key
+
+@st.fragment
+def render_scenario_results(results):
+    """Scenario comparison; a fragment, so interacting with it reruns only this block"""
     st.markdown("---")
-    persona = st.session_state.selected_persona
+    st.markdown(f"### 📊 Results for {len(results)} Persona(s)")
     
-    col1, col2 = st.columns([3, 1])
+    # Display results side by side
+    if len(results) == 1:
+        # Single column for one persona
+        result = results[0]
+        persona = result['persona']
+        
+        st.markdown(f"#### {persona['name']}")
+        st.caption(f"{persona.get('household', '')} • {persona['market'].upper()}")
+        
+        # Evidence grounding
+        if result['evidence']:
+            display_evidence_sources(result['evidence'], persona.get('market'))
+            st.markdown("---")
+        
+        # Answer
+        st.markdown("**Response:**")
+        st.write(result['answer'])
+        
+        # Evidence cards
+        if result['evidence']:
+            with st.expander(f"📊 View {len(result['evidence'])} evidence quotes"):
+                display_evidence_cards(result['evidence'], max_display=5)
+        
+    else:
+        # Multiple columns for comparison
+        cols = st.columns(min(len(results), 3))
+        
+        # Per-persona header text, worked out before the render loop
+        captions = []
+        for result in results:
+            persona = result['persona']
+            caption_lines = [persona['_short_household'], f"📍 {persona['market'].upper()}"]
+            if result['evidence']:
+                total_sources = len(result['evidence'])
+                caption_lines.append(f"Evidence: {grounding_strength(total_sources)} ({total_sources})")
+            captions.append("  \n".join(caption_lines))
+        
+        for idx, result in enumerate(results):
+            with cols[idx % 3]:
+                persona = result['persona']
+                
+                st.markdown(f"#### {persona['name']}")
+                
+                # Household, market and evidence grounding (compact) as one caption
+                st.caption(captions[idx])
+                
+                # Answer
+                st.markdown(f"---\n\n**Response:**\n\n{result['answer']}")
+                
+                # Evidence details, one markdown block for all quotes
+                if result['evidence']:
+                    with st.expander(f"📊 Evidence ({len(result['evidence'])})"):
+                        st.markdown(evidence_quotes_markdown(result['evidence'][:3], max_chars=150))
+                
+                if idx < len(results) - 1:
+                    st.markdown("")
+    
+    # Summary insights
+    st.markdown("---")
+    st.markdown("### 💡 Quick Insights")
+    
+    col1, col2, col3 = st.columns(3)
     with col1:
-        st.subheader(f"💬 Talking to: {persona['name']}")
-        household_info = persona.get('household', f"{persona.get('age', '')} • {persona.get('occupation', '')} • {persona['market'].upper()}")
-        st.caption(household_info)
+        st.metric("Personas Tested", len(results))
     with col2:
-        if st.button("🔄 Change Persona", use_container_width=True):
-            st.session_state.selected_persona = None
-            st.session_state.conversation = []
-            st.rerun()
+        total_evidence = sum(len(r['evidence']) for r in results)
+        avg_evidence = total_evidence / len(results) if results else 0
+        st.metric("Avg Evidence Sources", f"{avg_evidence:.1f}")
+    with col3:
+        avg_length = sum(len(r['answer'].split()) for r in results) / len(results) if results else 0
+        st.metric("Avg Response Length", f"{int(avg_length)} words")
+
+@st.fragment
+def render_persona_grid(markets):
+    """Persona picker: one selectbox grouped by market instead of a button per persona"""
+    options = [persona for market_personas in markets.values() for persona in market_personas]
+    current = st.session_state.selected_persona
+    current_idx = next((i for i, p in enumerate(options) if current and p['id'] == current['id']), None)
     
-    with st.expander("📋 Persona Profile"):
-        # Display new persona structure
-        if persona.get('household'):
-            st.write(f"**Household:** {persona['household']}")
-        if persona.get('devices'):
-            st.write(f"**Devices:** {', '.join(persona['devices'])}")
-        if persona.get('routines'):
-            st.write(f"**Routines:** {', '.join(persona['routines'])}")
-        if persona.get('tensions'):
-            st.write(f"**Tensions:** {', '.join(persona['tensions'])}")
-        if persona.get('language_style'):
-            st.write(f"**Language Style:** {persona['language_style']}")
-        
-        # Fallback to old structure
-        if persona.get('bio'):
-            st.write(f"**Bio:** {persona['bio']}")
-        if persona.get('pain_points'):
-            st.write(f"**Pain Points:** {', '.join(persona['pain_points'])}")
-        if persona.get('goals'):
-            st.write(f"**Goals:** {', '.join(persona['goals'])}")
+    choice = st.selectbox(
+        "Persona",
+        options,
+        index=current_idx,
+        format_func=lambda p: f"🌏 {p['market'].upper()} – {p['_label']}",
+        placeholder="Choose a persona to talk to...",
+        label_visibility="collapsed"
+    )
     
-    if st.session_state.conversation:
-        st.caption(f"📝 Conversation context: {len(st.session_state.conversation)} exchanges")
+    if choice is not None and (current is None or choice['id'] != current['id']):
+        st.session_state.selected_persona = choice
+        # Load existing conversation transcript for this persona
+        loaded_transcript = load_conversation_transcript(
+            choice['id'], 
+            st.session_state.session_id
+        )
+        st.session_state.conversation = loaded_transcript
+        st.rerun()
+
+# Greetings and meta-questions answered locally, without search or Claude
+TRIVIAL_REPLIES = {
+    'greeting': ({"hi", "hello", "hey", "hi there", "hello there", "good morning", "good afternoon", "good evening"},
+                 "Hi! I'm {name}, from {market}. What would you like to know about how I live?"),
+    'thanks': ({"thanks", "thank you", "thx", "cheers", "thanks a lot", "thank you so much"},
+               "You're welcome! Ask me anything else about my day-to-day."),
+    'identity': ({"who are you", "tell me about yourself", "introduce yourself"},
+                 "I'm {name}, from {market}. My household: {household}."),
+    'bye': ({"bye", "goodbye", "see you", "see ya"},
+            "Bye for now, it was nice talking!"),
+}
+
+def trivial_reply(persona, question):
+    """Canned persona-voiced answer for a trivial question, or None"""
+    key = normalize_question(question).strip(" !.?")
+    for phrases, template in TRIVIAL_REPLIES.values():
+        if key in phrases:
+            return template.format(
+                name=persona['name'],
+                market=persona.get('market', '').title(),
+                household=persona.get('household') or 'not specified',
+            )
+    return None
+
+def rerun_chat_turn():
+    """Rerun just the chat fragment, or the whole app when this is a full run
     
-    st.markdown("---")
+    A chat_input submit can be coalesced into a full-app run (e.g. with a
+    sidebar change), and Streamlit rejects scope="fragment" outside a
+    fragment rerun.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    in_fragment_rerun = bool(ctx and getattr(ctx, "fragment_ids_this_run", None))
+    st.rerun(scope="fragment" if in_fragment_rerun else "app")
+
+def render_condensed_conversation(conversation):
+    """Older exchanges as plain question/answer text in one markdown call"""
+    st.markdown("\n\n".join(
+        f"**Q:** {item['question']}\n\n{item['answer']}" for item in conversation
+    ))
+
+def render_conversation(persona, conversation):
+    """Past exchanges; drawn inside the chat_turn fragment
     
-    # Display conversation
-    for item in st.session_state.conversation:
+    Only the last MAX_TURNS are drawn as chat messages, older ones (which
+    trim_conversation_history has already stripped) go in a collapsed expander.
+    """
+    older, recent = conversation[:-MAX_TURNS], conversation[-MAX_TURNS:]
+    if older:
+        with st.expander(f"🕘 Earlier ({len(older)} exchanges)", expanded=False):
+            render_condensed_conversation(older)
+    
+    for item in recent:
         with st.chat_message("user"):
             st.write(item['question'])
         
@@ -483,7 +988,7 @@ if st.session_state.selected_persona:
             
             # Show evidence counts
             if item.get('evidence'):
-                display_evidence_sources(item['evidence'], persona.get('market'))
+                display_evidence_sources(item['evidence'], persona.get('market'), source_counts=item.get('source_counts'))
                 st.markdown("---")
             
             # Show answer
@@ -496,13 +1001,21 @@ if st.session_state.selected_persona:
                 # Show all evidence in expander if more than 3
                 if len(item['evidence']) > 3:
                     with st.expander(f"📊 View all {len(item['evidence'])} evidence quotes", expanded=False):
-                        for ev in item['evidence'][3:]:
-                            badge_text = get_evidence_badge(ev['source_type'])
-                            st.markdown(f"**{badge_text}** • {ev['market'].upper()}")
-                            st.info(f'"{ev["content"]}"')
-                            if ev.get('metadata'):
-                                st.caption(f"Metadata: {ev['metadata']}")
-                            st.markdown("")
+                        st.markdown(evidence_quotes_markdown(item['evidence'][3:], show_metadata=True))
+
+@st.fragment
+def chat_turn(persona):
+    """History, chat input and answer; a new message reruns only this fragment"""
+    if st.session_state.conversation:
+        st.caption(f"📝 Conversation context: {len(st.session_state.conversation)} exchanges")
+    # Drawn here rather than in the sidebar so the fragment rerun keeps it current
+    if st.session_state.trivial_hits:
+        st.caption(f"⚡ Answered locally (no search or Claude call): {st.session_state.trivial_hits}")
+    
+    st.markdown("---")
+    
+    # Display conversation
+    render_conversation(persona, st.session_state.conversation)
     
     # Chat input
     question = st.chat_input("Ask a question...")
@@ -511,27 +1024,53 @@ if st.session_state.selected_persona:
         with st.chat_message("user"):
             st.write(question)
         
+        # Greetings and thanks need no evidence, so skip the embed, search and LLM call
+        answer = trivial_reply(persona, question)
+        if answer is not None:
+            st.session_state.trivial_hits += 1
+            with st.chat_message("assistant", avatar="👤"):
+                st.write(answer)
+            st.session_state.conversation.append({
+                'question': question,
+                'answer': answer,
+                'trivial': True,
+                'timestamp': datetime.now().isoformat()
+            })
+            trim_conversation_history(st.session_state.conversation)
+            save_conversation_transcript(
+                persona['id'],
+                st.session_state.session_id,
+                st.session_state.conversation
+            )
+            rerun_chat_turn()
+        
         with st.chat_message("assistant", avatar="👤"):
             with st.spinner("Thinking..."):
                 all_debug_info = []
                 
-                # Get evidence
-                local_evidence, local_debug = search_evidence(question, persona.get('market', 'korea'), limit=5)
-                all_debug_info.extend(local_debug)
-                
-                global_evidence, global_debug = search_evidence(question, 'global', limit=2)
-                all_debug_info.extend(global_debug)
-                
-                all_evidence = local_evidence + global_evidence
+                # Get evidence (embed the question once for every search)
+                query_embedding = get_query_embedding(question)
+                # Canned greetings carry no context, so they are left out of the
+                # prompt and a question after "hi" still counts as an opening one
+                llm_history = [item for item in st.session_state.conversation if not item.get('trivial')]
+                history_free = not llm_history
+                try:
+                    all_evidence, search_debug = cached_persona_evidence(
+                        normalize_question(question), persona.get('market', 'korea'), st.session_state.show_debug, query_embedding
+                    )
+                    all_debug_info.extend(search_debug)
+                except Exception as e:
+                    all_evidence = []
+                    all_debug_info.append(f"❌ Evidence search error: {str(e)}")
                 
                 # Fallback
                 if not all_evidence:
                     all_debug_info.append("⚠️ Vector search found nothing. Trying fallback: getting random evidence...")
                     try:
-                        fallback = supabase.table("research_evidence").select("*").eq("market", persona.get('market', 'korea')).limit(3).execute()
-                        if fallback.data:
-                            all_debug_info.append(f"✅ Fallback found {len(fallback.data)} items (not semantically matched)")
-                            all_evidence = fallback.data
+                        fallback = fetch_fallback_evidence(persona.get('market', 'korea'))
+                        if fallback:
+                            all_debug_info.append(f"✅ Fallback found {len(fallback)} items (not semantically matched)")
+                            all_evidence = fallback
                         else:
                             all_debug_info.append("❌ Even fallback found nothing - database might be empty")
                     except Exception as e:
@@ -548,14 +1087,24 @@ if st.session_state.selected_persona:
                 display_evidence_sources(all_evidence, persona.get('market'))
                 st.markdown("---")
             
-            # Generate response
-            answer = generate_synthetic_response(
-                persona, 
-                question, 
-                all_evidence,
-                st.session_state.conversation
-            )
-            st.write(answer)
+            # Generate response, rendering tokens as they arrive. Keys with
+            # history almost never repeat, so only opening questions pay for
+            # the stored-response round trips
+            answer = None
+            if history_free:
+                cache_key = response_cache_key(persona['id'], question, all_evidence, [])
+                answer = fetch_stored_response(cache_key, persona['id'], query_embedding, select_llm_model(question))
+            if answer is not None:
+                st.write(answer)
+            else:
+                answer = st.write_stream(stream_synthetic_response(
+                    persona, 
+                    question, 
+                    all_evidence,
+                    llm_history
+                ))
+                if history_free:
+                    store_response(cache_key, answer, persona['id'], question, query_embedding)
             
             # Show top evidence cards
             if all_evidence:
@@ -564,24 +1113,20 @@ if st.session_state.selected_persona:
                 # Show all evidence in expander if more than 3
                 if len(all_evidence) > 3:
                     with st.expander(f"📊 View all {len(all_evidence)} evidence quotes", expanded=False):
-                        for ev in all_evidence[3:]:
-                            badge_text = get_evidence_badge(ev['source_type'])
-                            st.markdown(f"**{badge_text}** • {ev['market'].upper()}")
-                            st.info(f'"{ev["content"]}"')
-                            if ev.get('metadata'):
-                                st.caption(f"Metadata: {ev['metadata']}")
-                            st.markdown("")
+                        st.markdown(evidence_quotes_markdown(all_evidence[3:], show_metadata=True))
         
         # Save to conversation
-        from datetime import datetime
         exchange_data = {
             'question': question,
             'answer': answer,
-            'evidence': all_evidence,
-            'debug_info': all_debug_info if st.session_state.show_debug else [],
+            'evidence': [compact_evidence(ev) for ev in all_evidence],
+            'source_counts': count_evidence_sources(all_evidence),
             'timestamp': datetime.now().isoformat()
         }
+        if st.session_state.show_debug:
+            exchange_data['debug_info'] = all_debug_info
         st.session_state.conversation.append(exchange_data)
+        trim_conversation_history(st.session_state.conversation)
         
         # Save transcript to database
         save_conversation_transcript(
@@ -599,7 +1144,66 @@ if st.session_state.selected_persona:
             all_evidence
         )
         
-        st.rerun()
+        # Redraw the history with the new exchange; the page above is unchanged
+        rerun_chat_turn()
+
+# Load personas
+personas, markets = load_personas_and_markets()
+
+if not personas:
+    st.warning("⚠️ No personas found. Please run database setup first.")
+    st.stop()
+
+# Mode tabs
+tab1, tab2 = st.tabs(["💬 Chat", "🎯 Scenario Testing"])
+
+# ============================================================================
+# TAB 1: CHAT MODE (existing functionality)
+# ============================================================================
+with tab1:
+    # Persona Selection
+    st.subheader("🌍 Select a Persona")
+    
+    render_persona_grid(markets)
+
+# Chat Interface
+if st.session_state.selected_persona:
+    st.markdown("---")
+    persona = st.session_state.selected_persona
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.subheader(f"💬 Talking to: {persona['name']}")
+        household_info = persona.get('household', f"{persona.get('age', '')} • {persona.get('occupation', '')} • {persona['market'].upper()}")
+        st.caption(household_info)
+    with col2:
+        if st.button("🔄 Change Persona", use_container_width=True):
+            st.session_state.selected_persona = None
+            st.session_state.conversation = []
+            st.rerun()
+    
+    with st.expander("📋 Persona Profile"):
+        # Display new persona structure
+        if persona.get('household'):
+            st.write(f"**Household:** {persona['household']}")
+        if persona.get('devices'):
+            st.write(f"**Devices:** {', '.join(persona['devices'])}")
+        if persona.get('routines'):
+            st.write(f"**Routines:** {', '.join(persona['routines'])}")
+        if persona.get('tensions'):
+            st.write(f"**Tensions:** {', '.join(persona['tensions'])}")
+        if persona.get('language_style'):
+            st.write(f"**Language Style:** {persona['language_style']}")
+        
+        # Fallback to old structure
+        if persona.get('bio'):
+            st.write(f"**Bio:** {persona['bio']}")
+        if persona.get('pain_points'):
+            st.write(f"**Pain Points:** {', '.join(persona['pain_points'])}")
+        if persona.get('goals'):
+            st.write(f"**Goals:** {', '.join(persona['goals'])}")
+    
+    chat_turn(persona)
 
 # ============================================================================
 # TAB 2: SCENARIO TESTING MODE
@@ -611,13 +1215,6 @@ with tab2:
     # Persona selection for scenario testing
     st.markdown("### Select Personas to Compare")
     
-    # Group personas by market for better organization
-    markets = {}
-    for p in personas:
-        if p['market'] not in markets:
-            markets[p['market']] = []
-        markets[p['market']].append(p)
-    
     # Multi-select for personas
     selected_personas = []
     cols = st.columns(3)
@@ -626,12 +1223,8 @@ with tab2:
         with cols[idx % 3]:
             st.markdown(f"**{market.upper()}**")
             for persona in market_personas:
-                persona_label = f"{persona['name']}"
-                if persona.get('household'):
-                    persona_label += f" ({persona['household'][:30]}...)" if len(persona.get('household', '')) > 30 else f" ({persona['household']})"
-                
                 if st.checkbox(
-                    persona_label,
+                    persona['_label'],
                     key=f"scenario_{persona['id']}"
                 ):
                     selected_personas.append(persona)
@@ -653,110 +1246,41 @@ with tab2:
         elif not scenario_question:
             st.warning("Please enter a question")
         else:
-            st.markdown("---")
-            st.markdown(f"### 📊 Results for {len(selected_personas)} Persona(s)")
-            
-            # Process each persona
-            results = []
+            # Same question for every persona, so embed it once, then search
+            # each distinct market once
+            query_embedding = get_query_embedding(scenario_question)
+            scenario_markets = tuple(dict.fromkeys(p.get('market', 'korea') for p in selected_personas))
             
-            for persona in selected_personas:
-                with st.spinner(f"Getting response from {persona['name']}..."):
-                    # Get evidence
-                    local_evidence, _ = search_evidence(scenario_question, persona.get('market', 'korea'), limit=5)
-                    global_evidence, _ = search_evidence(scenario_question, 'global', limit=2)
-                    all_evidence = local_evidence + global_evidence
-                    
-                    # Generate response (no conversation history for scenario testing)
-                    answer = generate_synthetic_response(
-                        persona,
-                        scenario_question,
-                        all_evidence,
-                        []  # No conversation history
-                    )
-                    
-                    results.append({
-                        'persona': persona,
-                        'answer': answer,
-                        'evidence': all_evidence
-                    })
+            # Personas are independent and network-bound, so ask them all at once
+            # and tick each one off as it answers
+            results = [None] * len(selected_personas)
+            with st.status(f"Getting responses from {len(selected_personas)} persona(s)...") as status:
+                try:
+                    evidence_by_market = search_scenario_evidence(normalize_question(scenario_question), scenario_markets, query_embedding)
+                except Exception as e:
+                    status.write(f"⚠️ Evidence search failed ({str(e)}), answering without evidence")
+                    evidence_by_market = {}
+                with ThreadPoolExecutor(max_workers=min(len(selected_personas), SCENARIO_WORKERS)) as scenario_pool:
+                    futures = {
+                        scenario_pool.submit(
+                            run_scenario_persona, persona, scenario_question,
+                            evidence_by_market.get(persona.get('market', 'korea'), []), query_embedding
+                        ): idx
+                        for idx, persona in enumerate(selected_personas)
+                    }
+                    for future in as_completed(futures):
+                        result, new_key = future.result()
+                        if new_key:
+                            store_response(new_key, result['answer'], result['persona']['id'], scenario_question, query_embedding)
+                        results[futures[future]] = result
+                        status.write(f"✅ {result['persona']['name']}")
+                status.update(label=f"Got {len(results)} response(s)", state="complete", expanded=False)
             
-            # Display results side by side
-            if len(results) == 1:
-                # Single column for one persona
-                result = results[0]
-                persona = result['persona']
-                
-                st.markdown(f"#### {persona['name']}")
-                st.caption(f"{persona.get('household', '')} • {persona['market'].upper()}")
-                
-                # Evidence grounding
-                if result['evidence']:
-                    display_evidence_sources(result['evidence'], persona.get('market'))
-                    st.markdown("---")
-                
-                # Answer
-                st.markdown("**Response:**")
-                st.write(result['answer'])
-                
-                # Evidence cards
-                if result['evidence']:
-                    with st.expander(f"📊 View {len(result['evidence'])} evidence quotes"):
-                        display_evidence_cards(result['evidence'], max_display=5)
-                
-            else:
-                # Multiple columns for comparison
-                cols = st.columns(min(len(results), 3))
-                
-                for idx, result in enumerate(results):
-                    with cols[idx % 3]:
-                        persona = result['persona']
-                        
-                        st.markdown(f"#### {persona['name']}")
-                        st.caption(f"{persona.get('household', '')[:40]}..." if len(persona.get('household', '')) > 40 else persona.get('household', ''))
-                        st.caption(f"📍 {persona['market'].upper()}")
-                        
-                        # Evidence grounding (compact)
-                        if result['evidence']:
-                            total_sources = len(result['evidence'])
-                            if total_sources >= 5:
-                                strength = "🟢 Strong"
-                            elif total_sources >= 3:
-                                strength = "🟡 Moderate"
-                            else:
-                                strength = "🟠 Light"
-                            st.caption(f"Evidence: {strength} ({total_sources})")
-                        
-                        st.markdown("---")
-                        
-                        # Answer
-                        st.markdown("**Response:**")
-                        st.write(result['answer'])
-                        
-                        # Evidence details
-                        if result['evidence']:
-                            with st.expander(f"📊 Evidence ({len(result['evidence'])})"):
-                                for ev in result['evidence'][:3]:
-                                    badge = get_evidence_badge(ev['source_type'])
-                                    st.caption(f"**{badge}**")
-                                    st.info(f'"{ev["content"][:150]}..."' if len(ev["content"]) > 150 else f'"{ev["content"]}"')
-                        
-                        if idx < len(results) - 1:
-                            st.markdown("")
-            
-            # Summary insights
-            st.markdown("---")
-            st.markdown("### 💡 Quick Insights")
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Personas Tested", len(results))
-            with col2:
-                total_evidence = sum(len(r['evidence']) for r in results)
-                avg_evidence = total_evidence / len(results) if results else 0
-                st.metric("Avg Evidence Sources", f"{avg_evidence:.1f}")
-            with col3:
-                avg_length = sum(len(r['answer'].split()) for r in results) / len(results) if results else 0
-                st.metric("Avg Response Length", f"{int(avg_length)} words")
+            st.session_state.scenario_results = results
+    
+    # Results stay on screen across reruns without asking the personas again
+    if st.session_state.scenario_results:
+        render_scenario_results(st.session_state.scenario_results)
 
 # Sidebar info
 with st.sidebar:
@@ -770,6 +1294,15 @@ with st.sidebar:
     - Conversation memory
     - Multi-market support
     """)
+    
+    # Personas and evidence are cached for up to an hour; pick up edits now
+    if st.button("🔄 Refresh Data", use_container_width=True, help="Reload personas and evidence from the database"):
+        fetch_personas.clear()
+        fetch_fallback_evidence.clear()
+        cached_persona_evidence.clear()
+        search_scenario_evidence.clear()
+        get_market_index.clear()
+        st.rerun()
 
 st.markdown("---")
 st.caption("Powered by Claude + Supabase • Synthetic User Research")
\ No newline at end of file
@@ -1,8 +1,5 @@
 import streamlit as st
 import os
-from supabase import create_client
-from langchain_anthropic import ChatAnthropic
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.messages import HumanMessage, SystemMessage
 
 # Simple config
@@ -14,6 +11,11 @@ st.caption("Before/After: Generic vs. Grounded in Real Transcripts")
 # Initialize
 @st.cache_resource
 def init_services():
+    # Heavy imports (torch via HuggingFaceEmbeddings) happen once, on first load
+    from supabase import create_client
+    from langchain_anthropic import ChatAnthropic
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    
     supabase = create_client(
         st.secrets.get("SUPABASE_URL", os.getenv("SUPABASE_URL")),
         st.secrets.get("SUPABASE_KEY", os.getenv("SUPABASE_KEY"))
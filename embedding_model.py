@@ -0,0 +1,229 @@
+"""
+Shared Embedding Model
+
+Loads all-MiniLM-L6-v2 once per process so the Streamlit app and the
+ingestion scripts use the same model object instead of each loading
+their own copy of the weights.
+
+Set EMBEDDING_BACKEND=onnx to serve the model through ONNX Runtime with
+dynamic int8 quantization (needs `optimum[onnxruntime]`). The quantized
+model is exported on first use and then reused from EMBEDDING_ONNX_DIR.
+
+Set EMBEDDING_BACKEND=torch to call the transformers model directly
+(tokenizer + AutoModel + mean pooling) under torch.compile, skipping the
+sentence-transformers wrapper for low-latency single-query encoding.
+"""
+
+import os
+import logging
+import threading
+from functools import lru_cache
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+MAX_SEQ_LENGTH = 256
+
+ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".onnx_model")
+)
+ONNX_FILE = 'model_quantized.onnx'
+ONNX_PROVIDER = 'CPUExecutionProvider'
+
+logger = logging.getLogger(__name__)
+
+_model = None
+_model_lock = threading.Lock()
+
+class PooledEmbeddingModel:
+    """Tokenize in batches and mean-pool token embeddings, SentenceTransformer.encode interface
+    
+    Subclasses run one tokenized batch through their model in _embed_batch
+    and return the pooled numpy vectors.
+    """
+    
+    tensor_type = "np"
+    
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+    
+    def _embed_batch(self, inputs):
+        raise NotImplementedError
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, show_progress_bar=False):
+        import numpy as np
+        
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors=self.tensor_type
+            )
+            batches.append(self._embed_batch(inputs))
+        
+        vectors = np.concatenate(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+        if normalize_embeddings:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        
+        return vectors[0] if single else vectors
+
+class OnnxEmbeddingModel(PooledEmbeddingModel):
+    """int8 ONNX Runtime model"""
+    
+    def _embed_batch(self, inputs):
+        import numpy as np
+        
+        token_embeddings = self.model(**inputs).last_hidden_state
+        
+        # Mean pooling over non-padding tokens
+        mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+class TorchEmbeddingModel(PooledEmbeddingModel):
+    """transformers AutoModel, optionally under torch.compile
+    
+    encode is serialized with a lock: the preload thread, the script thread
+    and worker threads may all embed, and a compiled module is not safe to
+    call concurrently.
+    """
+    
+    tensor_type = "pt"
+    
+    def __init__(self, model, tokenizer):
+        super().__init__(model, tokenizer)
+        self._lock = threading.Lock()
+    
+    def _embed_batch(self, inputs):
+        import torch
+        
+        with torch.inference_mode():
+            token_embeddings = self.model(**inputs).last_hidden_state
+            
+            # Mean pooling over non-padding tokens
+            mask = inputs["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            pooled = (token_embeddings * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        return pooled.numpy()
+    
+    def encode(self, *args, **kwargs):
+        with self._lock:
+            return super().encode(*args, **kwargs)
+
+def _load_torch_model():
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    
+    torch.set_num_threads(os.cpu_count() or 1)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+    
+    if hasattr(torch, "compile"):
+        # Query lengths vary, so compile with dynamic shapes to avoid recompiles.
+        # Compilation is lazy, so run one encode here: a compiler or backend
+        # failure then falls back to the eager model instead of breaking the
+        # first real query. The default mode suits CPU; reduce-overhead is
+        # for CUDA graphs.
+        compiled = TorchEmbeddingModel(torch.compile(model, dynamic=True), tokenizer)
+        try:
+            compiled.encode("warm up", normalize_embeddings=True)
+            return compiled
+        except Exception:
+            logger.warning("torch.compile failed, using the eager model", exc_info=True)
+    
+    return TorchEmbeddingModel(model, tokenizer)
+
+def _export_onnx_model():
+    """Export MiniLM to ONNX and quantize it to int8 (one-time)"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    
+    fp32_dir = os.path.join(ONNX_DIR, "fp32")
+    ORTModelForFeatureExtraction.from_pretrained(
+        MODEL_NAME, export=True, provider=ONNX_PROVIDER
+    ).save_pretrained(fp32_dir)
+    
+    quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=ONNX_DIR, quantization_config=qconfig)
+    
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(ONNX_DIR)
+
+def _load_onnx_model():
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    
+    if not os.path.exists(os.path.join(ONNX_DIR, ONNX_FILE)):
+        _export_onnx_model()
+    
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    
+    model = ORTModelForFeatureExtraction.from_pretrained(
+        ONNX_DIR,
+        file_name=ONNX_FILE,
+        provider=ONNX_PROVIDER,
+        session_options=options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(ONNX_DIR)
+    return OnnxEmbeddingModel(model, tokenizer)
+
+_BACKENDS = {
+    "onnx": _load_onnx_model,
+    "torch": _load_torch_model,
+}
+
+def get_model():
+    """Return the process-wide embedding model, loading it on first use"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            loader = _BACKENDS.get(os.getenv("EMBEDDING_BACKEND", "").lower())
+            if loader:
+                try:
+                    _model = loader()
+                except Exception:
+                    # Optional backend missing, or its export / session setup
+                    # failed; sentence-transformers is set as the model below,
+                    # so the backend is not retried on every call
+                    logger.warning("EMBEDDING_BACKEND failed to load, using sentence-transformers", exc_info=True)
+                    _model = None
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+def preload_model():
+    """Start loading the model on a daemon thread; get_model() waits for it"""
+    thread = threading.Thread(target=get_model, name="embedding-preload", daemon=True)
+    thread.start()
+    return thread
+
+class QueryEmbeddings:
+    """Thin adapter exposing the embed_query interface used by app.py
+    
+    Results are kept in a per-instance LRU so repeated questions skip the
+    model. It is a plain dict lookup, safe to call from worker threads.
+    
+    With decimals set, components are rounded before they are returned, which
+    keeps the JSON body of vector RPC calls short.
+    """
+    
+    def __init__(self, model=None, cache_size=512, decimals=None):
+        self.model = model or get_model()
+        self.decimals = decimals
+        self.embed_query = lru_cache(maxsize=cache_size)(self._embed)
+    
+    def _embed(self, text):
+        vector = self.model.encode(text, normalize_embeddings=True).tolist()
+        if self.decimals is not None:
+            vector = [round(x, self.decimals) for x in vector]
+        return vector
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-import os
 from supabase import create_client
-from sentence_transformers import SentenceTransformer
+from embedding_model import get_model
 from tqdm import tqdm # For a nice progress bar
 
+# Rows encoded per model.encode call (larger on GPU, where fp16 batches are cheap)
+BATCH_SIZE = 64
+GPU_BATCH_SIZE = 256
+
 def main():
     print("=" * 60)
     print("🚀 RESEARCH EVIDENCE EMBEDDING PROCESSOR")
@@ -16,7 +19,15 @@ def main():
 
     # 2. Load Model (all-MiniLM-L6-v2 = 384 dimensions)
     print("\n🤖 Loading AI Model...")
-    model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    model = get_model()
+
+    # sentence-transformers already picks CUDA when it is available; run the
+    # backfill in fp16 there so the GEMMs use tensor cores
+    on_gpu = getattr(getattr(model, 'device', None), 'type', None) == 'cuda'
+    if on_gpu:
+        model.half()
+    batch_size = GPU_BATCH_SIZE if on_gpu else BATCH_SIZE
+    print(f"   Device: {'cuda (fp16)' if on_gpu else 'cpu'}, batch size {batch_size}")
 
     # 3. Fetch data missing embeddings
     print("📊 Scanning for items needing embeddings...")
@@ -36,22 +47,59 @@ def main():
     success_count = 0
     fail_count = 0
 
-    for item in tqdm(items, desc="Generating Embeddings"):
-        try:
-            # Generate the vector
-            vector = model.encode(item['content']).tolist()
-
-            # Save via RPC (Remote Procedure Call)
-            # This is the 'secret sauce' that bypasses type-casting errors
-            supabase.rpc("update_evidence_embedding", {
-                "row_id": item['id'],
-                "new_embedding": vector
-            }).execute()
-
-            success_count += 1
-        except Exception as e:
-            print(f"\n❌ Error on ID {item['id']}: {e}")
-            fail_count += 1
+    # Shortest first, so every batch pads to a similar length
+    items.sort(key=lambda item: len(item['content']))
+
+    with tqdm(total=len(items), desc="Generating Embeddings") as progress:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+
+            # Generate the vectors (unit length, so inner product == cosine)
+            # in one forward pass per batch
+            try:
+                vectors = model.encode(
+                    [item['content'] for item in batch],
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+            except Exception as e:
+                print(f"\n❌ Error encoding batch starting at ID {batch[0]['id']}: {e}")
+                fail_count += len(batch)
+                progress.update(len(batch))
+                continue
+
+            # Save the whole batch in one RPC (sql/update_evidence_embeddings.sql)
+            try:
+                result = supabase.rpc("update_evidence_embeddings", {
+                    "updates": [
+                        {"id": item['id'], "embedding": vector.tolist()}
+                        for item, vector in zip(batch, vectors)
+                    ]
+                }).execute()
+                updated = result.data or 0
+                success_count += updated
+                fail_count += len(batch) - updated
+                progress.update(len(batch))
+                continue
+            except Exception as e:
+                print(f"\n⚠️ Batch update failed ({e}), saving rows one at a time")
+
+            for item, vector in zip(batch, vectors):
+                try:
+                    # Save via RPC (Remote Procedure Call)
+                    # This is the 'secret sauce' that bypasses type-casting errors
+                    supabase.rpc("update_evidence_embedding", {
+                        "row_id": item['id'],
+                        "new_embedding": vector.tolist()
+                    }).execute()
+
+                    success_count += 1
+                except Exception as e:
+                    print(f"\n❌ Error on ID {item['id']}: {e}")
+                    fail_count += 1
+                progress.update(1)
 
     print("\n" + "=" * 60)
     print(f"🏁 PROCESSING COMPLETE")
@@ -0,0 +1,13 @@
+-- Composite index for reading a session's conversation log
+--
+-- conversation_logs is append-only, one row per exchange. Reviewing a
+-- persona session filters on (persona_id, session_id) and reads the newest
+-- rows first, which this index serves without a sort. Run outside a
+-- transaction block: concurrently avoids locking out the app's inserts.
+--
+-- persona_conversation_transcripts needs no extra index: the app's
+-- upsert(on_conflict='persona_id,session_id') already relies on a unique
+-- constraint over those columns, which load_conversation_transcript uses.
+
+create index concurrently if not exists conversation_logs_session_created_at_idx
+  on conversation_logs (persona_id, session_id, created_at desc);
@@ -0,0 +1,39 @@
+-- content_hash column for research_evidence
+--
+-- add_evidence.py hashes each item's market, source type and text
+-- (sha256 of market || '\n' || source_type || '\n' || content, hex) and
+-- skips rows whose hash is already stored, so re-running an import does not
+-- re-embed or duplicate unchanged content. The same text under another
+-- market or source type hashes differently and is kept. The unique
+-- constraint makes the client's upsert(on_conflict='content_hash') safe
+-- under concurrent imports.
+--
+-- Existing duplicates must be removed before the unique constraint can be
+-- added; the delete below keeps the oldest row (rows without created_at
+-- last, then lowest id) of each group that repeats the same market, source
+-- type and content, which is what content_hash covers. Safe to re-run.
+
+alter table research_evidence
+  add column if not exists content_hash char(64);
+
+update research_evidence
+  set content_hash = encode(sha256(convert_to(
+    market || E'\n' || source_type || E'\n' || content, 'UTF8')), 'hex');
+
+delete from research_evidence
+  where id in (
+    select id from (
+      select id, row_number() over (
+        partition by content_hash
+        order by created_at nulls last, id
+      ) as rn
+      from research_evidence
+    ) ranked
+    where rn > 1
+  );
+
+alter table research_evidence
+  drop constraint if exists research_evidence_content_hash_key;
+
+alter table research_evidence
+  add constraint research_evidence_content_hash_key unique (content_hash);
@@ -0,0 +1,21 @@
+-- Store research_evidence embeddings as halfvec (FP16)
+--
+-- Halves the size of every stored vector (768 bytes instead of 1536) and
+-- of the HNSW index, so scans move half the memory. MiniLM recall is
+-- effectively unchanged at FP16.
+--
+-- Requires pgvector 0.7+. Run after evidence_hnsw_ip_index.sql, then
+-- re-run search_evidence_multi.sql. Clients keep sending plain float
+-- arrays; Postgres converts them to halfvec on insert. If the original
+-- search_evidence function is still in use, cast its query_embedding
+-- argument to halfvec(384) the same way search_evidence_multi does.
+
+drop index if exists research_evidence_embedding_hnsw_ip;
+
+alter table research_evidence
+  alter column embedding type halfvec(384)
+  using embedding::halfvec(384);
+
+create index if not exists research_evidence_embedding_hnsw_ip
+  on research_evidence
+  using hnsw (embedding halfvec_ip_ops);
@@ -0,0 +1,13 @@
+-- HNSW index for inner-product search on research_evidence
+--
+-- add_evidence.py, generate_emebdings.py and the app all produce unit-length
+-- MiniLM vectors, so inner product equals cosine similarity. The index uses
+-- vector_ip_ops to match the <#> operator in search_evidence_multi.
+--
+-- Rows embedded before normalization was made explicit are already unit
+-- length (all-MiniLM-L6-v2 ends in a Normalize layer), so no backfill is
+-- needed.
+
+create index if not exists research_evidence_embedding_hnsw_ip
+  on research_evidence
+  using hnsw (embedding vector_ip_ops);
@@ -0,0 +1,30 @@
+-- Per-market partial HNSW indexes on research_evidence
+--
+-- With one index over every market, an HNSW scan walks the whole graph and
+-- then drops rows from other markets, which can leave fewer than
+-- match_count results. A partial index per market only holds rows that can
+-- match. search_evidence_multi inlines the market as a literal so the
+-- planner can choose the matching index.
+--
+-- Add an index here when a new market is introduced. The full-table index
+-- from evidence_halfvec.sql remains for unfiltered queries.
+
+create index if not exists research_evidence_embedding_hnsw_korea
+  on research_evidence using hnsw (embedding halfvec_ip_ops)
+  with (m = 16, ef_construction = 64)
+  where market = 'korea';
+
+create index if not exists research_evidence_embedding_hnsw_poland
+  on research_evidence using hnsw (embedding halfvec_ip_ops)
+  with (m = 16, ef_construction = 64)
+  where market = 'poland';
+
+create index if not exists research_evidence_embedding_hnsw_turkey
+  on research_evidence using hnsw (embedding halfvec_ip_ops)
+  with (m = 16, ef_construction = 64)
+  where market = 'turkey';
+
+create index if not exists research_evidence_embedding_hnsw_global
+  on research_evidence using hnsw (embedding halfvec_ip_ops)
+  with (m = 16, ef_construction = 64)
+  where market = 'global';
@@ -0,0 +1,15 @@
+-- llm_response_cache: answers shared across sessions and app processes
+--
+-- app.py keys each answer on a sha256 (hex) of the persona id, question,
+-- evidence ids and recent history, so only an identical prompt is a hit.
+-- Rows are written by the app after a miss; prune old ones with e.g.
+--   delete from llm_response_cache where created_at < now() - interval '30 days';
+
+create table if not exists llm_response_cache (
+  key char(64) primary key,
+  answer text not null,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists llm_response_cache_created_at_idx
+  on llm_response_cache (created_at);
@@ -0,0 +1,55 @@
+-- Semantic lookups for llm_response_cache
+--
+-- Run after llm_response_cache.sql. For turns without conversation history
+-- (a chat's first question, every scenario question) the app also stores
+-- the persona, the model that answered and the question embedding with
+-- each answer, so a paraphrase of an earlier question to the same persona
+-- can reuse its answer.
+--
+-- match_response_cache returns the exact key match if there is one,
+-- otherwise the closest stored question for that persona and model whose
+-- cosine similarity (inner product of unit vectors) is at least
+-- match_threshold. Both cases are served in one round trip. The exact key
+-- already includes the model.
+
+alter table llm_response_cache
+  add column if not exists persona_id text,
+  add column if not exists question text,
+  add column if not exists embedding halfvec(384),
+  add column if not exists model text;
+
+create index if not exists llm_response_cache_embedding_hnsw
+  on llm_response_cache using hnsw (embedding halfvec_ip_ops);
+
+-- Earlier versions of this function had no llm_model argument
+drop function if exists match_response_cache(text, text, vector, float);
+
+create or replace function match_response_cache(
+  cache_key text,
+  persona text,
+  query_embedding vector(384),
+  match_threshold float default 0.95,
+  llm_model text default null
+)
+returns table (answer text, similarity float)
+language sql stable
+security invoker
+as $$
+  (
+    select c.answer, 1.0::float
+    from llm_response_cache c
+    where c.key = cache_key
+  )
+  union all
+  (
+    select c.answer, -(c.embedding <#> query_embedding::halfvec(384)) as similarity
+    from llm_response_cache c
+    where c.persona_id = persona
+      and c.model is not distinct from llm_model
+      and c.embedding is not null
+      and -(c.embedding <#> query_embedding::halfvec(384)) >= match_threshold
+    order by c.embedding <#> query_embedding::halfvec(384)
+    limit 1
+  )
+  limit 1;
+$$;
@@ -0,0 +1,52 @@
+-- search_evidence
+--
+-- Single-market vector search, used by the app only when
+-- search_evidence_multi is unavailable. It returns just the columns the
+-- app reads (no embedding), and it delegates to search_evidence_multi so
+-- both functions share the same index-friendly query.
+--
+-- Replaces the version from database setup, whose return type may
+-- include the full row; a function's return type can't be changed with
+-- create or replace, so any existing overloads are dropped first.
+-- Run after search_evidence_multi.sql.
+
+do $$
+declare
+  f regprocedure;
+begin
+  for f in
+    select p.oid::regprocedure
+    from pg_proc p
+    join pg_namespace n on n.oid = p.pronamespace
+    where p.proname = 'search_evidence' and n.nspname = 'public'
+  loop
+    execute format('drop function %s', f);
+  end loop;
+end;
+$$;
+
+create function search_evidence(
+  query_embedding vector(384),
+  market_filter text,
+  match_threshold float default 0.65,
+  match_count int default 5
+)
+returns table (
+  id research_evidence.id%type,
+  market research_evidence.market%type,
+  source_type research_evidence.source_type%type,
+  content research_evidence.content%type,
+  metadata research_evidence.metadata%type,
+  similarity float
+)
+language sql stable
+security invoker
+as $$
+  select *
+  from search_evidence_multi(
+    query_embedding,
+    array[market_filter],
+    array[match_count],
+    match_threshold
+  );
+$$;
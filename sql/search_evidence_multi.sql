@@ -0,0 +1,58 @@
+-- search_evidence_multi
+--
+-- Vector search over several markets in one round trip. Each market gets
+-- its own match count, e.g. 5 rows for the persona's market and 2 for
+-- 'global'. Rows come back grouped in the order of market_filters, each
+-- group ordered by similarity.
+--
+-- Embeddings are stored L2-normalized, so the negative inner product
+-- operator (<#>) ranks the same as cosine distance without computing
+-- norms per row. The column is halfvec(384) (see evidence_halfvec.sql), so
+-- the query vector is cast to match and the halfvec_ip_ops HNSW indexes
+-- apply: the per-market partial indexes from
+-- evidence_market_partial_indexes.sql, or the full-table index from
+-- evidence_halfvec.sql for markets without one. security invoker keeps row
+-- level security in force.
+--
+-- Run in the Supabase SQL editor once the research_evidence table from
+-- database setup exists, and before search_evidence.sql, which delegates
+-- to this function.
+
+create or replace function search_evidence_multi(
+  query_embedding vector(384),
+  market_filters text[],
+  match_counts int[],
+  match_threshold float default 0.65
+)
+returns table (
+  id research_evidence.id%type,
+  market research_evidence.market%type,
+  source_type research_evidence.source_type%type,
+  content research_evidence.content%type,
+  metadata research_evidence.metadata%type,
+  similarity float
+)
+language plpgsql stable
+security invoker
+as $$
+declare
+  i int;
+begin
+  for i in 1 .. coalesce(array_length(market_filters, 1), 0) loop
+    -- The market is inlined as a literal so the planner can pick that
+    -- market's partial HNSW index (evidence_market_partial_indexes.sql)
+    return query execute format(
+      'select e.id, e.market, e.source_type, e.content, e.metadata,
+              -(e.embedding <#> $1) as similarity
+       from research_evidence e
+       where e.market = %L
+         and e.embedding is not null
+         and -(e.embedding <#> $1) > $2
+       order by e.embedding <#> $1
+       limit $3',
+      market_filters[i]
+    )
+    using query_embedding::halfvec(384), match_threshold, match_counts[i];
+  end loop;
+end;
+$$;
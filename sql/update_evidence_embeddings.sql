@@ -0,0 +1,26 @@
+-- update_evidence_embeddings
+--
+-- Batched form of update_evidence_embedding for generate_emebdings.py:
+-- one call writes a whole encode batch in a single UPDATE instead of one
+-- RPC and one transaction per row. Takes a JSON array of
+-- {"id": ..., "embedding": [...]} objects and returns how many rows were
+-- updated.
+--
+-- jsonb_populate_recordset types each element as a research_evidence row,
+-- so ids keep the table's key type (and its index) and the float arrays
+-- are parsed straight into the embedding column's type.
+
+create or replace function update_evidence_embeddings(updates jsonb)
+returns int
+language sql
+security invoker
+as $$
+  with updated as (
+    update research_evidence e
+    set embedding = u.embedding
+    from jsonb_populate_recordset(null::research_evidence, updates) u
+    where e.id = u.id
+    returning 1
+  )
+  select count(*)::int from updated;
+$$;